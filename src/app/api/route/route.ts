@@ -8,6 +8,7 @@
  */
 
 import { NextResponse } from "next/server";
+import { decodePolyline } from "@/lib/utils";
 
 interface RouteRequest {
   origin: { lat: number; lng: number };
@@ -91,6 +92,7 @@ export async function POST(request: Request) {
           origin: { lat: origin.lat, lng: origin.lng },
           destination: { lat: destination.lat, lng: destination.lng },
           mode,
+          include_path: true,
         }),
         signal: controller.signal,
       });
@@ -98,9 +100,13 @@ export async function POST(request: Request) {
       clearTimeout(timeoutId);
 
       if (localResponse.ok) {
-        const data = await localResponse.json();
+        const { path_polyline, ...data } = await localResponse.json();
         console.log(`[Route API] ✓ OSMnx success: ${data.distance_km} km, ${data.duration_minutes} min`);
-        return NextResponse.json({ ...data, source: "osmnx" });
+        return NextResponse.json({
+          ...data,
+          path_coordinates: path_polyline ? decodePolyline(path_polyline) : undefined,
+          source: "osmnx",
+        });
       } else {
         console.warn(`[Route API] OSMnx error: ${localResponse.status}`);
       }
@@ -24,7 +24,7 @@ interface OSMnxRouteResponse {
   distance_km: number;
   duration_minutes: number;
   mode: string;
-  path_coordinates?: number[][];
+  path_polyline?: string;
   success: boolean;
   error?: string;
 }
@@ -86,7 +86,7 @@ export class DistanceCalculationAgent extends BaseAgent {
     from: { lat: number; lng: number },
     to: { lat: number; lng: number },
     mode: "drive" | "walk" | "bike" = "drive"
-  ): Promise<{ distanceKm: number; durationMinutes: number; path?: number[][] } | null> {
+  ): Promise<{ distanceKm: number; durationMinutes: number } | null> {
     try {
       const response = await fetch(`${OSMNX_SERVICE_URL}/route`, {
         method: "POST",
@@ -104,7 +104,6 @@ export class DistanceCalculationAgent extends BaseAgent {
           return {
             distanceKm: data.distance_km,
             durationMinutes: data.duration_minutes,
-            path: data.path_coordinates,
           };
         }
       }
@@ -75,3 +75,36 @@ export function generateCurvedLine(
   
   return points;
 }
+
+/**
+ * Decode a Google encoded polyline (precision 5).
+ * Returns points as [lng, lat] pairs for GeoJSON.
+ */
+export function decodePolyline(encoded: string): [number, number][] {
+  const points: [number, number][] = [];
+  let index = 0;
+  let lat = 0;
+  let lng = 0;
+
+  while (index < encoded.length) {
+    // Each point is a pair of zigzag-encoded deltas in 5-bit chunks
+    const deltas: number[] = [];
+    for (let i = 0; i < 2; i++) {
+      let result = 0;
+      let shift = 0;
+      let byte: number;
+      do {
+        byte = encoded.charCodeAt(index++) - 63;
+        result |= (byte & 0x1f) << shift;
+        shift += 5;
+      } while (byte >= 0x20);
+      deltas.push(result & 1 ? ~(result >> 1) : result >> 1);
+    }
+
+    lat += deltas[0];
+    lng += deltas[1];
+    points.push([lng / 1e5, lat / 1e5]);
+  }
+
+  return points;
+}